@@ -12,6 +12,7 @@ from cue import parse_cue
 
 class bchunk(object):
     SECTLEN         = 2352
+    BUFSIZE         = 1 << 20
     WAV_FORMAT_HLEN = 24
     WAV_DATA_HLEN   = 8
     
@@ -19,7 +20,7 @@ class bchunk(object):
         t = self.tracks[idx]
         print('Read file', idx, self.tracks[idx]['FILE']) if self._verbose else None
 
-        with open(t['FILE'], "rb") as i:
+        with open(t['FILE'], "rb", buffering=self.BUFSIZE) as i:
             # Find the last index for this track. Assume this is the
             # data track
             index = None
@@ -27,7 +28,7 @@ class bchunk(object):
                 index = t['INDEX'][_i]
 
             i.seek(index['STARTSECT'] * self.SECTLEN)
-            with open(fn, "wb") as o:
+            with open(fn, "wb", buffering=self.BUFSIZE) as o:
                 print('Write track', fn) if self._verbose else None
                 reallen = int((index['STOPSECT'] - index['STARTSECT'] + 1) * t['BSIZE'])
 
@@ -8,7 +8,6 @@ import os
 import pathlib
 import pygubu
 import re
-import requests
 import shutil
 import subprocess
 import tkinter as tk
@@ -410,7 +409,7 @@ class PopFePs3App:
                 if _p < 0:
                     raise Exception('Not a HTTP link')
                 _s = _s[:_p]
-                ret = requests.get(_s, stream=True)
+                ret = popfe._SESSION.get(_s, stream=True)
                 if ret.status_code != 200:
                     raise Exception('Failed to fetch file ', _s)
                 self.icon0 = Image.open(io.BytesIO(ret.content))
@@ -466,7 +465,7 @@ class PopFePs3App:
                 if _p < 0:
                     raise Exception('Not a HTTP link')
                 _s = _s[:_p]
-                ret = requests.get(_s, stream=True)
+                ret = popfe._SESSION.get(_s, stream=True)
                 if ret.status_code != 200:
                     raise Exception('Failed to fetch file ', _s)
                 self.pic0 = Image.open(io.BytesIO(ret.content))
@@ -522,7 +521,7 @@ class PopFePs3App:
                 if _p < 0:
                     raise Exception('Not a HTTP link')
                 _s = _s[:_p]
-                ret = requests.get(_s, stream=True)
+                ret = popfe._SESSION.get(_s, stream=True)
                 if ret.status_code != 200:
                     raise Exception('Failed to fetch file ', _s)
                 self.pic1 = Image.open(io.BytesIO(ret.content))
@@ -670,9 +669,10 @@ class PopFePs3App:
         magic_word = []
         subchannels = []
         for idx in range(len(self.cue_files)):
-            if self.real_disc_ids[idx] in libcrypt:
-                magic_word.append(libcrypt[self.real_disc_ids[idx]]['magic_word'])
-                subchannels.append(popfe.generate_subchannels(libcrypt[self.real_disc_ids[idx]]['magic_word']))
+            lc = libcrypt.get(self.real_disc_ids[idx])
+            if lc:
+                magic_word.append(lc['magic_word'])
+                subchannels.append(popfe.generate_subchannels(lc['magic_word']))
             else:
                 magic_word.append(0)
                 subchannels.append(None)
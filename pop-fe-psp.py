@@ -492,8 +492,9 @@ class PopFePs3App:
         resolution = 1
         subchannels = []
         for idx in range(len(self.cue_files)):
-            if self.real_disc_ids[idx] in libcrypt:
-                subchannels.append(popfe.generate_subchannels(libcrypt[self.real_disc_ids[idx]]['magic_word']))
+            lc = libcrypt.get(self.real_disc_ids[idx])
+            if lc:
+                subchannels.append(popfe.generate_subchannels(lc['magic_word']))
             else:
                 subchannels.append(None)
 
@@ -17,11 +17,13 @@ except:
     print('You need to install python module pillow')
 import argparse
 import datetime
+import functools
 import hashlib
 import io
 import os
 import re
 import random
+import runpy
 import shutil
 import struct
 import sys
@@ -52,12 +54,29 @@ try:
     import PyPDF2
 except:
     print('PyPDF2 is not installed.\nYou should install requests by running:\npip3 install PyPDF2')
+have_turbojpeg = False
+try:
+    import numpy as np
+    from turbojpeg import TurboJPEG, TJPF_RGB, TJSAMP_444
+    _TJ = TurboJPEG()
+    have_turbojpeg = True
+except:
+    True
+have_requests_cache = False
+try:
+    import requests_cache
+    have_requests_cache = True
+except:
+    True
 try:
     import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
 except:
     print('requests is not installed.\nYou should install requests by running:\npip3 install requests')
 import subprocess
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 try:
     from vmp import encode_vmp
 except:
@@ -1877,17 +1896,129 @@ i0 = bytes([
 
 PSX_SITE = 'https://psxdatacenter.com/'
 verbose = False
+# Binary coded decimal lookup. Negative values are included so they map to
+# the same bytes the old int(i % 10) + 16 * (int(i / 10) % 10) helper gave.
+_BCD = {i: int(i % 10) + 16 * (int(i / 10) % 10) for i in range(-99, 100)}
+
+# Regexes used when parsing CUE files
+_RE_CUE_FILE = re.compile(r'^\s*FILE')
+_RE_CUE_FILE_BIN = re.compile(r'FILE "?(.*?)"? BINARY')
+_RE_FILE_QUOTED = re.compile(r'".*"')
+# Sectors with libcrypt protection and which bit of the magic word they encode
+_MW_TABLE = {
+    14105: 0x8000, 14110: 0x8000,
+    14231: 0x4000, 14236: 0x4000,
+    14485: 0x2000, 14490: 0x2000,
+    14579: 0x1000, 14584: 0x1000,
+    14649: 0x0800, 14654: 0x0800,
+    14899: 0x0400, 14904: 0x0400,
+    15056: 0x0200, 15061: 0x0200,
+    15130: 0x0100, 15135: 0x0100,
+    15242: 0x0080, 15247: 0x0080,
+    15312: 0x0040, 15317: 0x0040,
+    15378: 0x0020, 15383: 0x0020,
+    15628: 0x0010, 15633: 0x0010,
+    15919: 0x0008, 15924: 0x0008,
+    16031: 0x0004, 16036: 0x0004,
+    16101: 0x0002, 16106: 0x0002,
+    16167: 0x0001, 16172: 0x0001
+    }
+# Match all the sectors in one pass over the page
+_RE_MW_SECTOR = re.compile('<td>(%s)</td>' % '|'.join(str(i) for i in _MW_TABLE))
+
+# External helpers, resolved once instead of checking os.name at every call
+_IS_POSIX = os.name == 'posix'
+if _IS_POSIX:
+    CUE2CU2_CMD = ['python3', 'Cue2cu2/cue2cu2.py']
+    BINMERGE_CMD = ['python3', 'binmerge/binmerge']
+    ATRACDENC_CMD = ['./atracdenc/src/atracdenc']
+    LCP_CMD = ['./lcp']
+else:
+    CUE2CU2_CMD = ['cue2cu2.exe']
+    BINMERGE_CMD = ['binmerge.exe']
+    ATRACDENC_CMD = ['atracdenc/src/atracdenc']
+    LCP_CMD = ['lcp.exe']
+
+# Check if the script/binary for one of the commands above is installed
+@functools.lru_cache(maxsize=None)
+def have_cmd(path):
+    return os.path.exists(path)
+
+# cue2cu2 and binmerge are python scripts on posix. Run them inside this
+# interpreter instead of starting a new python3 for every disc.
+def run_cmd(cmd, args):
+    if cmd[0] != 'python3':
+        return subprocess.call(cmd + args)
+    argv = sys.argv
+    sys.argv = cmd[1:] + args
+    try:
+        runpy.run_path(cmd[1], run_name='__main__')
+    except SystemExit as e:
+        return e.code
+    except Exception as e:
+        print('Failed to run', cmd[1], e)
+        return 1
+    finally:
+        sys.argv = argv
+    return 0
+
+# Share one session for all downloads so we can reuse the keep-alive
+# connections instead of doing a new TLS handshake for every fetch.
+# If requests_cache is available we also keep an on-disk cache of everything
+# we download so converting the same game again does not hit the network.
+# The cache lives in the per-user cache directory, not wherever we were
+# started from.
+_SESSION = None
+try:
+    if have_requests_cache:
+        try:
+            _SESSION = requests_cache.CachedSession('pop-fe-httpcache',
+                                                    backend='sqlite',
+                                                    use_cache_dir=True,
+                                                    expire_after=datetime.timedelta(days=30),
+                                                    allowable_codes=(200,))
+        except:
+            print('Could not open the download cache, continuing without it')
+    if _SESSION is None:
+        _SESSION = requests.Session()
+    _SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8,
+                                           max_retries=Retry(total=3, backoff_factor=0.3)))
+    _SESSION.headers['User-Agent'] = 'pop-fe'
+except:
+    True
 if sys.platform == 'win32':
     font = 'arial.ttf'
 else:
     font = 'DejaVuSansMono.ttf'
 
+# Extract the first size bytes of a track the same way bchunk.writetrack
+# would write it.
+def _extract_iso_prefix(bc, idx, size):
+    t = bc.tracks[idx]
+    index = None
+    for _i in t['INDEX']:
+        index = t['INDEX'][_i]
+
+    nsect = min(index['STOPSECT'] - index['STARTSECT'] + 1, -(-size // t['BSIZE']))
+    with open(t['FILE'], 'rb') as f:
+        f.seek(index['STARTSECT'] * bc.SECTLEN)
+        raw = memoryview(f.read(nsect * bc.SECTLEN))
+    return b''.join(raw[pos + t['BSTART']:pos + t['BSTART'] + t['BSIZE']] for pos in range(0, len(raw), bc.SECTLEN))
+
+# path is either the name of an ISO file or a file-like object holding
+# the start of the ISO.
 def _get_gameid_from_iso(path='NORMAL01.iso'):
-    with open(path, 'rb') as f:
-        h = hashlib.md5(f.read(1024*1024)).hexdigest()
-        print('MD5 fingerprint', h)
-        if h in gameid_by_md5sum:
-            return gameid_by_md5sum[h]['id'], h
+    if isinstance(path, str):
+        with open(path, 'rb') as f:
+            return _get_gameid_from_iso_fp(f, path)
+    return _get_gameid_from_iso_fp(path, None)
+
+def _get_gameid_from_iso_fp(f, path):
+    f.seek(0)
+    h = hashlib.md5(f.read(1024*1024)).hexdigest()
+    print('MD5 fingerprint', h)
+    if h in gameid_by_md5sum:
+        return gameid_by_md5sum[h]['id'], h
 
     if not have_pycdlib and not have_iso9660:
         raise Exception('Can not find either pycdlib or pycdio. Try either \'pip3 install pycdio\' or \'pip3 install pycdlib\'.')
@@ -1896,15 +2027,16 @@ def _get_gameid_from_iso(path='NORMAL01.iso'):
     if have_pycdlib:
         try:
             iso = pycdlib.PyCdlib()
-            iso.open(path)
-            extracted = io.BytesIO()
-            iso.get_file_from_iso_fp(extracted, iso_path='/SYSTEM.CNF;1')
-            extracted.seek(0)
-            buf = str(extracted.read(1024))
-            iso.close()
+            iso.open_fp(f)
+            try:
+                extracted = io.BytesIO()
+                iso.get_file_from_iso_fp(extracted, iso_path='/SYSTEM.CNF;1')
+                buf = extracted.getvalue()[:1024]
+            finally:
+                iso.close()
         except:
             True
-    if not buf and have_iso9660:
+    if not buf and have_iso9660 and path:
         try:
             iso = iso9660.ISO9660.IFS(source=path)
             st = iso.stat('system.cnf', True)
@@ -1912,44 +2044,37 @@ def _get_gameid_from_iso(path='NORMAL01.iso'):
                 raise Exception('Could not open system.cnf')
 
             buf = iso.seek_read(st['LSN'])[1][:128]
+            if isinstance(buf, str):
+                buf = buf.encode('latin-1')
             iso.close()
         except:
             True
 
+    if not buf and not path:
+        raise Exception('Could not find system.cnf in the start of the ISO')
     if not buf:
         print('Failed to read game id. Falling back to raw read')
-        with open(path, 'rb') as f:
-            f.seek(0x8028)
-            buf = str(f.read(9))[2:-1]
-            if buf in gameid_translation:
-                return gameid_translation[buf]['id'], h
-            if buf != '         ':
-                return buf, h
-            else:
-                return 'UNKN00000', h
+        f.seek(0x8028)
+        buf = str(f.read(9))[2:-1]
+        if buf in gameid_translation:
+            return gameid_translation[buf]['id'], h
+        if buf != '         ':
+            return buf, h
+        else:
+            return 'UNKN00000', h
 
-    idx = buf.find('cdrom:')
+    # system.cnf is parsed as raw bytes, only the id itself is decoded
+    idx = buf.find(b'cdrom:')
     if idx < 0:
         raise Exception('Could not read system.cnf')
 
     buf = buf[idx + 6:idx + 50]
-    idx = buf.find('\\r')
-    if idx > 0:
-        buf = buf[:idx]
-    idx = buf.find('\r')
-    if idx > 0:
-        buf = buf[:idx]
-    idx = buf.find('\\n')
-    if idx > 0:
-        buf = buf[:idx]
-    idx = buf.find('\n')
-    if idx > 0:
-        buf = buf[:idx]
-    idx = buf.find(';1')
-    if idx > 0:
-        buf = buf[:idx]
+    for eol in [b'\r', b'\n', b';1']:
+        idx = buf.find(eol)
+        if idx > 0:
+            buf = buf[:idx]
     # Some games are of the form \DIR\SLPS12345, get rid of the path
-    buf = buf.split('\\')[-1]
+    buf = buf.split(b'\\')[-1].decode('ascii', errors='ignore')
     
     bad_chars = "\\_. -"
     for i in bad_chars:
@@ -1961,9 +2086,8 @@ def _get_gameid_from_iso(path='NORMAL01.iso'):
         game_id = gameid_translation[game_id]['id']
     if len(game_id) != 9:
         print('cdrom: line in system.cnf does not contain a proper id, read disc label instead')
-        with open(path, 'rb') as f:
-            f.seek(0x8028)
-            game_id = str(f.read(9))[2:-1].upper()
+        f.seek(0x8028)
+        game_id = str(f.read(9))[2:-1].upper()
     # Special handling of games with broken id in system.cnf
     if game_id in gameid_translation:
         game_id = gameid_translation[game_id]['id']
@@ -1979,7 +2103,7 @@ def get_gameid_from_iso(path='NORMAL01.iso'):
 
 def fetch_cached_file(path):
     try:
-        ret = requests.get(PSX_SITE + path)
+        ret = _SESSION.get(PSX_SITE + path)
     except:
         return None
     print('get', PSX_SITE + path) if verbose else None
@@ -1993,7 +2117,7 @@ def fetch_cached_file(path):
 
 def fetch_cached_binary(path):
     try:
-        ret = requests.get(PSX_SITE + path, stream=True)
+        ret = _SESSION.get(PSX_SITE + path, stream=True)
     except:
         print('fetch_cached_binary: Failed to fetch file ', PSX_SITE + path)
         return None
@@ -2017,7 +2141,11 @@ def get_snd0_from_theme(theme, game_id, subdir):
         temp_files.append(tmpfile)
         url = themes[theme]['url'] + '/blob/main/data/' + game_id + '/SND0.WAV' + '?raw=true'
         print('Try URL', url)
-        subprocess.run(['wget', '-q', url, '-O', tmpfile], timeout=30, check=True)
+        ret = _SESSION.get(url, timeout=30)
+        if ret.status_code != 200:
+            return None
+        with open(tmpfile, 'wb') as o:
+            o.write(ret.content)
         return tmpfile
     except:
         return None
@@ -2077,7 +2205,7 @@ def get_image_from_theme(theme, game_id, subdir, image):
     try:
         url = themes[theme]['url'] + '/raw/main/data/' + game_id + '/' + image
         print('Try URL', url) #if verbose else None
-        ret = requests.get(url, stream=True)
+        ret = _SESSION.get(url, stream=True)
         if ret.status_code != 200:
             return None
 
@@ -2094,10 +2222,11 @@ def get_icon0_from_game(game_id, game, cue, tmpfile, psn_frame_size=None):
     except:
         True
 
+    fcb = None
     if 'icon0' in games[game_id]:
         if not games[game_id]['icon0']:
             return None
-        ret = requests.get(games[game_id]['icon0'], stream=True)
+        ret = _SESSION.get(games[game_id]['icon0'], timeout=10)
         if ret.status_code != 200:
             return None
         fcb = ret.content
@@ -2109,7 +2238,7 @@ def get_icon0_from_game(game_id, game, cue, tmpfile, psn_frame_size=None):
                 return Image.new("RGBA", (80,80), (255,255,255,0))
 
         l = 'https://raw.githubusercontent.com/xlenore/psx-covers/main/covers/default/' + game_id[:4] + '-' + game_id[4:9] +'.jpg'
-        ret = requests.get(l, stream=True)
+        ret = _SESSION.get(l, timeout=10)
         if ret.status_code == 200:
             fcb = ret.content
             
@@ -2133,6 +2262,11 @@ def get_icon0_from_game(game_id, game, cue, tmpfile, psn_frame_size=None):
         return im0
     return i
 
+# Call fetch(game_id, game, ...) once the gamelist page for the game has
+# been downloaded by game_future
+def fetch_with_game(fetch, game_id, game_future, *args):
+    return fetch(game_id, game_future.result(), *args)
+
 def get_pic_from_game(pic, game_id, game, filename):
     try:
         image = Image.open(filename)
@@ -2148,12 +2282,12 @@ def get_pic_from_game(pic, game_id, game, filename):
 
         _h = hashlib.md5(games[game_id][pic].encode('utf-8')).hexdigest()
         f = 'https://github.com/sahlberg/pop-fe-assets/raw/master/' + pic + '/' + _h
-        ret = requests.get(f, stream=True)
+        ret = _SESSION.get(f, stream=True)
         if ret.status_code == 200:
             print('Found cached prebuilt', pic.upper(), f)
             return Image.open(io.BytesIO(ret.content))
     
-        ret = requests.get(games[game_id][pic], stream=True)
+        ret = _SESSION.get(games[game_id][pic], stream=True)
         if ret.status_code == 200:
             if ret.apparent_encoding:
                 return Image.open(io.BytesIO(ret.content.decode(ret.apparent_encoding)))
@@ -2226,7 +2360,7 @@ def get_pic1_from_bc(game_id, game, cue):
     
     path = games[game_id]['url'][:-5].replace('games', 'images/hires')
     path = path + '/' + path.split('/')[-1] + '-B-ALL.jpg'
-    ret = requests.get(PSX_SITE + path, stream=True)
+    ret = _SESSION.get(PSX_SITE + path, stream=True)
     if ret.status_code != 200:
         return Image.new("RGBA", (80, 80), (255,255,255,0))
 
@@ -2238,7 +2372,7 @@ def get_icon0_from_disc(game_id, game, cue, filename):
     
     path = games[game_id]['url'][:-5].replace('games', 'images/hires')
     path = path + '/' + path.split('/')[-1] + '-D-ALL.jpg'
-    ret = requests.get(PSX_SITE + path, stream=True)
+    ret = _SESSION.get(PSX_SITE + path, stream=True)
     if ret.status_code != 200:
         return Image.new("RGBA", (80, 80), (255,255,255,0))
 
@@ -2262,10 +2396,7 @@ def convert_snd0_to_at3(snd0, at3, duration, max_size, subdir = './'):
         s = parse_riff(tmp_wav)
         print('Creating temporary ATRAC3 file', tmp_snd0) if verbose else None
         try:
-            if os.name == 'posix':
-                subprocess.run(['./atracdenc/src/atracdenc', '--encode=atrac3', '-i', tmp_wav, '-o', tmp_snd0], check=True, stdout=subprocess.DEVNULL)
-            else:
-                subprocess.run(['atracdenc/src/atracdenc', '--encode=atrac3', '-i', tmp_wav, '-o', tmp_snd0], check=True, stdout=subprocess.DEVNULL)
+            subprocess.run(ATRACDENC_CMD + ['--encode=atrac3', '-i', tmp_wav, '-o', tmp_snd0], check=True, stdout=subprocess.DEVNULL)
         except:
             print('XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX\natracdenc not found.\nCan not create SND0.AT3\nPlease see README file for how to install atracdenc\nXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX')
             return None
@@ -2283,7 +2414,7 @@ def get_snd0_from_link(link, subdir='./'):
     _h = hashlib.md5(link.encode('utf-8')).hexdigest()
     f = 'https://github.com/sahlberg/pop-fe-assets/raw/master/snd0/' + _h
     try:
-        ret = requests.get(f, stream=True)
+        ret = _SESSION.get(f, stream=True)
     except:
         return None
     if ret.status_code == 200:
@@ -2315,7 +2446,7 @@ def get_snd0_from_game(game_id, subdir='./'):
 
 def get_psio_cover(game_id):
     f = 'https://raw.githubusercontent.com/logi-26/psio-assist/main/covers/' + game_id + '.bmp'
-    ret = requests.get(f, stream=True)
+    ret = _SESSION.get(f, stream=True)
     if ret.status_code != 200:
         raise Exception('Failed to fetch file ', f)
 
@@ -2324,7 +2455,7 @@ def get_psio_cover(game_id):
 def generate_magic_word(url):
     print('Compute MagicWord from URL', url)
     
-    ret = requests.get(url)
+    ret = _SESSION.get(url)
     print('get', url) if verbose else None
     if ret.status_code != 200:
         raise Exception('Failed to fetch file ', url)
@@ -2339,50 +2470,28 @@ def generate_magic_word(url):
     b = b[:idx]
 
     mw = 0
-    if b.find('<td>14105</td>') > 0 or b.find('<td>14110</td>') > 0:
-        mw = mw | 0x8000
-    if b.find('<td>14231</td>') > 0 or b.find('<td>14236</td>') > 0:
-        mw = mw | 0x4000
-    if b.find('<td>14485</td>') > 0 or b.find('<td>14490</td>') > 0:
-        mw = mw | 0x2000
-    if b.find('<td>14579</td>') > 0 or b.find('<td>14584</td>') > 0:
-        mw = mw | 0x1000
-
-    if b.find('<td>14649</td>') > 0 or b.find('<td>14654</td>') > 0:
-        mw = mw | 0x0800
-    if b.find('<td>14899</td>') > 0 or b.find('<td>14904</td>') > 0:
-        mw = mw | 0x0400
-    if b.find('<td>15056</td>') > 0 or b.find('<td>15061</td>') > 0:
-        mw = mw | 0x0200
-    if b.find('<td>15130</td>') > 0 or b.find('<td>15135</td>') > 0:
-        mw = mw | 0x0100
-        
-    if b.find('<td>15242</td>') > 0 or b.find('<td>15247</td>') > 0:
-        mw = mw | 0x0080
-    if b.find('<td>15312</td>') > 0 or b.find('<td>15317</td>') > 0:
-        mw = mw | 0x0040
-    if b.find('<td>15378</td>') > 0 or b.find('<td>15383</td>') > 0:
-        mw = mw | 0x0020
-    if b.find('<td>15628</td>') > 0 or b.find('<td>15633</td>') > 0:
-        mw = mw | 0x0010
-        
-    if b.find('<td>15919</td>') > 0 or b.find('<td>15924</td>') > 0:
-        mw = mw | 0x0008
-    if b.find('<td>16031</td>') > 0 or b.find('<td>16036</td>') > 0:
-        mw = mw | 0x0004
-    if b.find('<td>16101</td>') > 0 or b.find('<td>16106/td>') > 0:
-        mw = mw | 0x0002
-    if b.find('<td>16167</td>') > 0 or b.find('<td>16172</td>') > 0:
-        mw = mw | 0x0001
+    for m in _RE_MW_SECTOR.finditer(b):
+        mw = mw | _MW_TABLE[int(m.group(1))]
 
     print('MagicWord %04x' % mw)
     return mw
     
 def get_first_bin_in_cue(cue):
     with open(cue, "r") as f:
-        files = re.findall('".*"', f.read())
+        files = _RE_FILE_QUOTED.findall(f.read())
         return files[0][1:-1]
 
+# Loading a truetype font means parsing the whole TTF file so only do it
+# once for each size we use
+@functools.lru_cache(maxsize=8)
+def _font(size):
+    return ImageFont.truetype(font, size)
+
+def _text_size(d, text, fnt):
+    # ImageDraw.textsize() was removed in pillow 10
+    bbox = d.textbbox((0, 0), text, font=fnt)
+    return bbox[2], bbox[3]
+
 def add_image_text(image, title, game_id):
     # Add a nice title text to the background image
     # Split it into separate lines
@@ -2390,37 +2499,85 @@ def add_image_text(image, title, game_id):
     print('Add image text: title:', title) if verbose else None
     strings = title.split(' - ')
     y = 18
-    txt = Image.new("RGBA", image.size, (255,255,255,0))
-    fnt = ImageFont.truetype(font, 8)
-    d = ImageDraw.Draw(txt)
+    fnt = _font(8)
+    # The text is fully opaque so we can draw it straight onto the image
+    d = ImageDraw.Draw(image)
 
     # Add Title (multiple lines) to upper right
     for t in strings:
-        ts = d.textsize(t, font=fnt)
+        ts = _text_size(d, t, fnt)
         d.text((image.size[0] - ts[0], y), t, font=fnt,
                fill=(255,255,255,255))
         y = y + ts[1] + 2
 
     # Add game-id to bottom right
-    fnt = ImageFont.truetype(font, 10)
-    ts = d.textsize(game_id, font=fnt)
+    fnt = _font(10)
+    ts = _text_size(d, game_id, fnt)
     d.rectangle([(image.size[0] - ts[0] - 1, image.size[1] - ts[1] + 1),
                  (image.size[0] + 1, image.size[1] + 1)],
                 fill=(0,0,0,255))
     d.text((image.size[0] - ts[0], image.size[1] - ts[1] - 1),
            game_id, font=fnt, fill=(255,255,255,255))
 
-    image = Image.alpha_composite(image, txt)
     return image
 
+# Save an RGB image as a quality 100, 4:4:4 JPEG. Use libjpeg-turbo
+# through PyTurboJPEG if it is available as it is a lot faster than the
+# libjpeg that pillow ships with.
+def save_jpeg(image, f):
+    if have_turbojpeg:
+        with open(f, 'wb') as o:
+            o.write(_TJ.encode(np.asarray(image), quality=100,
+                               pixel_format=TJPF_RGB,
+                               jpeg_subsample=TJSAMP_444))
+        return
+    image.save(f, format='JPEG', quality=100, subsampling=0)
+
+# Resize an image and convert it to RGB. For modes without alpha the
+# conversion is done on the smaller of the source and the resized image so
+# we touch as few pixels as possible.
+def resize_rgb(image, size):
+    if image.mode == 'RGB':
+        return image.resize(size, Image.Resampling.BILINEAR)
+    # pillow resizes images with alpha premultiplied, which turns fully
+    # transparent pixels black, so these must always be resized first.
+    if image.mode in ['RGBA', 'LA', 'PA', 'RGBa', 'La']:
+        return image.resize(size, Image.Resampling.BILINEAR).convert('RGB')
+    # pillow can only do NEAREST on palette images so convert those first
+    if image.mode in ['1', 'P'] or image.size[0] * image.size[1] < 2 * size[0] * size[1]:
+        return image.convert('RGB').resize(size, Image.Resampling.BILINEAR)
+    return image.resize(size, Image.Resampling.BILINEAR).convert('RGB')
+
+# ioctl to make a copy-on-write clone of a file on btrfs/xfs
+_FICLONE = 0x40049409
+
 def copy_file(inp, oup):
-    with open(inp, "rb") as i:
-        with open(oup, "wb") as o:
-            while True:
-                buf = i.read(1024*1024)
-                if len(buf) == 0:
-                    break
-                o.write(buf)
+    # If the filesystem supports reflinks the copy is instant and only the
+    # blocks we later patch get duplicated.
+    if sys.platform.startswith('linux'):
+        try:
+            import fcntl
+            with open(inp, "rb") as i:
+                with open(oup, "wb") as o:
+                    fcntl.ioctl(o.fileno(), _FICLONE, i.fileno())
+            return
+        except:
+            True
+    # shutil uses the fastest copy the platform has, sendfile on Linux with
+    # a fallback to a plain read/write copy where that is not supported,
+    # CopyFileW on windows.
+    shutil.copyfile(inp, oup)
+
+# Copy a list of (source, destination) files. The copies are independent
+# of each other so run them in parallel to make better use of the disk.
+def copy_files(files):
+    if not files:
+        return
+    with ThreadPoolExecutor(max_workers=min(4, len(files))) as ex:
+        futures = [(oup, ex.submit(copy_file, inp, oup)) for inp, oup in files]
+        for oup, future in futures:
+            future.result()
+            print('Installed', oup) if verbose else None
 
 
 def create_path(bin, f):
@@ -2430,21 +2587,15 @@ def create_path(bin, f):
     return f
 
 def create_retroarch_thumbnail(dest, game_title, icon0, pic1):
-        try:
-            os.stat(dest + '/Named_Boxarts')
-        except:
-            os.mkdir(dest + '/Named_Boxarts')
+        os.makedirs(dest + '/Named_Boxarts', exist_ok=True)
     
-        image = icon0.resize((256,256), Image.Resampling.BILINEAR)
+        image = icon0.resize((256,256), Image.Resampling.LANCZOS, reducing_gap=3.0)
         #The following characters in playlist titles must be replaced with _ in the corresponding thumbnail filename: &*/:`<>?\|
         f = args.retroarch_thumbnail_dir + '/Named_Boxarts/' + game_title + '.png'
         print('Save cover as', f) if verbose else None
         image.save(f, 'PNG')
 
-        try:
-            os.stat(args.retroarch_thumbnail_dir + '/Named_Snaps')
-        except:
-            os.mkdir(args.retroarch_thumbnail_dir + '/Named_Snaps')
+        os.makedirs(args.retroarch_thumbnail_dir + '/Named_Snaps', exist_ok=True)
         image = pic1.resize((512,256), Image.Resampling.BILINEAR)
         #The following characters in playlist titles must be replaced with _ in the corresponding thumbnail filename: &*/:`<>?\|
         f = args.retroarch_thumbnail_dir + '/Named_Snaps/' + game_title + '.png'
@@ -2502,9 +2653,7 @@ def create_metadata(cue, game_id, game_title, icon0, pic0, pic1, snd0, manual):
             os.stat(create_path(cue, f + '.snd0'))
         except:
             print('Installing SND0')
-            with open(snd0, 'rb') as i:
-                with open(create_path(cue, f + '.snd0'), 'wb') as o:
-                    o.write(i.read())
+            copy_file(snd0, create_path(cue, f + '.snd0'))
         
     # MANUAL
     if manual and game_id in games and 'manual' in games[game_id]:
@@ -2512,25 +2661,16 @@ def create_metadata(cue, game_id, game_title, icon0, pic0, pic1, snd0, manual):
             os.stat(create_path(cue, f + '.manual'))
         except:
             print('Installing MANUAL')
-            with open(manual, 'rb') as i:
-                with open(create_path(cue, f + '.manual'), 'wb') as o:
-                    o.write(i.read())
+            copy_file(manual, create_path(cue, f + '.manual'))
 
         
 def get_imgs_from_bin(cue):
     def get_file_name(line):
-        # strip off leading 'FILE '
-        pos = line.lower().index('file ')
-        line = line[pos + 5:]
-        # strip off trailing 'binary '
-        pos = line.lower().index(' binary')
-        line = line[:pos+1]
-        #strip off leading ' '
-        while line[0] == ' ':
-            line = line[1:]
-        #strip off trailing ' '
-        while line[-1] == ' ':
-            line = line[:-1]
+        # strip off leading 'FILE ' and trailing ' binary'
+        low = line.lower()
+        start = low.index('file ') + 5
+        end = low.index(' binary', start)
+        line = line[start:end + 1].strip(' ')
         # remove double quotes
         if line[0] == '"' and line[-1] == '"':
             line = line[1:-1]
@@ -2542,11 +2682,10 @@ def get_imgs_from_bin(cue):
     print('CUE', cue) if verbose else None
 
     img_files = []
-    with open(cue, 'r') as f:
-        lines = f.readlines()
-        for line in lines:
+    with open(cue, 'r') as fd:
+        for line in fd:
             # FILE
-            if re.search('^\s*FILE', line):
+            if _RE_CUE_FILE.match(line):
                 f = get_file_name(line)
                 # unix absilute paths start with /
                 # windows absolute patsh start with ?:/
@@ -2559,10 +2698,8 @@ def get_imgs_from_bin(cue):
 
 
 def create_retroarch_bin(dest, game_title, cue_files, img_files):
-    try:
-        os.mkdir(dest)
-    except:
-        True
+    os.makedirs(dest, exist_ok=True)
+    copies = []
     with open(dest + '/' + game_title + '.m3u', 'wb') as md:
         for i in range(len(img_files)):
             g = game_title
@@ -2571,14 +2708,12 @@ def create_retroarch_bin(dest, game_title, cue_files, img_files):
 
             f = dest + '/' + g
             print('Installing', f) if verbose else None
-            copy_file(img_files[i], f)
+            copies.append((img_files[i], f))
+    copy_files(copies)
             
 
 def create_retroarch_cue(dest, game_title, cue_files, img_files, magic_word):
-    try:
-        os.mkdir(dest)
-    except:
-        True
+    os.makedirs(dest, exist_ok=True)
     with open(dest + '/' + 'PSISO.m3u', 'wb') as md:
         for i in range(len(cue_files)):
             p = 'PSISO%d' % i
@@ -2586,7 +2721,7 @@ def create_retroarch_cue(dest, game_title, cue_files, img_files, magic_word):
                 md.write(bytes(p + '.CD' + chr(13) + chr(10), encoding='utf-8'))
                 cur_cue = open(cue_files[i], 'r')
                 for line in cur_cue:
-                    m = re.search('FILE "?(.*?)"? BINARY', line)
+                    m = _RE_CUE_FILE_BIN.search(line)
                     if m:
                         nc.write(bytes('FILE \"%s.bin\" BINARY' % p + chr(13) + chr(10), encoding='utf-8'))
                     else:
@@ -2601,13 +2736,10 @@ def create_retroarch_cue(dest, game_title, cue_files, img_files, magic_word):
                 
 def create_psio(dest, game_id, game_title, icon0, cu2_files, img_files):
     f = dest + '/' + game_title
-    try:
-        os.mkdir(f)
-    except:
-        True
+    os.makedirs(f, exist_ok=True)
 
     with open(f + '/' + game_id[0:4] + '-' + game_id[4:9] + '.bmp', 'wb') as d:
-        image = icon0.resize((80,84), Image.Resampling.BILINEAR)
+        image = icon0.resize((80,84), Image.Resampling.LANCZOS, reducing_gap=3.0)
         i = io.BytesIO()
         image.save(i, format='BMP')
         i.seek(0)
@@ -2617,6 +2749,7 @@ def create_psio(dest, game_id, game_title, icon0, cu2_files, img_files):
         os.unlink(f + '/MULTIDISC.LST')
     except:
         True
+    copies = []
     with open(f + '/MULTIDISC.LST', 'wb') as md:
         for i in range(len(img_files)):
             g = game_title
@@ -2625,14 +2758,12 @@ def create_psio(dest, game_id, game_title, icon0, cu2_files, img_files):
             md.write(bytes(g + chr(13) + chr(10), encoding='utf-8'))
 
             print('Installing', f + '/' + g) if verbose else None
-            copy_file(img_files[i], f + '/' + g)
-            copy_file(cu2_files[i], f + '/' + g[:-4] + '.cu2')
+            copies.append((img_files[i], f + '/' + g))
+            copies.append((cu2_files[i], f + '/' + g[:-4] + '.cu2'))
+    copy_files(copies)
 
 
 def get_toc_from_cu2(cu2):
-    def bcd(i):
-        return int(i % 10) + 16 * (int(i / 10) % 10)
-
     _toc_header = bytes([
         0x41, 0x00, 0xa0, 0x00, 0x00, 0x00, 0x00, 0x01, 0x20, 0x00,
         0x01, 0x00, 0xa1, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
@@ -2641,50 +2772,33 @@ def get_toc_from_cu2(cu2):
     
     toc = bytearray(_toc_header)
 
-    with open(cu2, 'r') as f:
-        lines = f.readlines()
-
-        # Find the number of tracks and trk_end
+    with open(cu2, 'r') as fd:
+        # The data1 line always comes before the track lines so we can
+        # build the TOC in a single pass. Number of tracks and the lead-out
+        # are filled into the header once we have read them.
         num_tracks = None
         trk_end = None
         data = None
-        for line in lines:
-            if re.search('data', line):
-                data = line[10:10 + 8]
-            if re.search('^ntracks', line):
+        track = 1
+        for line in fd:
+            if line.startswith('ntracks'):
                 num_tracks = int(line[7:])
-            if re.search('^trk end', line):
+                continue
+            if line.startswith('trk end'):
                 trk_end = line[10:]
-        # number of tracks
-        toc[17] = bcd(num_tracks)
-        # size of image
-        m = bcd(int(trk_end[:2]))
-        s = bcd(int(trk_end[3:5]) - 2)
-        f = bcd(int(trk_end[6:8]))
-
-        # lead-out is the next frame
-        f = f + 1
-        if f == 75:
-            s = s + 1
-            f = 0
-        if s == 60:
-            m = m + 1
-            s = 0
-        toc[27] = m
-        toc[28] = s
-        toc[29] = f
-        track = 1
-        for line in lines:
-            if not re.search('^data', line) and not re.search('^track', line):
                 continue
-            
+            if line.startswith('data'):
+                data = line[10:10 + 8]
+            elif not line.startswith('track'):
+                continue
+
             msf = line[10:]
             buf = bytearray(10)
             if track == 1:
                 buf[0] = 0x41
-                buf[2] = bcd(track)
-                buf[3] = bcd(int(data[:2]))
-                buf[4] = bcd(int(data[3:5]))
+                buf[2] = _BCD[track]
+                buf[3] = _BCD[int(data[:2])]
+                buf[4] = _BCD[int(data[3:5])]
                 buf[5] = 1
                 m = int(data[:2])
                 s = int(data[3:5])
@@ -2694,33 +2808,52 @@ def get_toc_from_cu2(cu2):
                 buf[9] = f
             else:
                 buf[0] = 0x01
-                buf[2] = bcd(track)
-                m = bcd(int(msf[:2])  - 2*int(data[:2]))
+                buf[2] = _BCD[track]
+                m = _BCD[int(msf[:2])  - 2*int(data[:2])]
                 _s = int(msf[3:5]) - 2*int(data[3:5])
                 _s = _s + 2
                 if _s >= 60:
                     m = m + 1
                     _s = _s - 60
-                s = bcd(_s)
-                f = bcd(int(msf[6:8]) - 2*int(data[6:8]))
+                s = _BCD[_s]
+                f = _BCD[int(msf[6:8]) - 2*int(data[6:8])]
                 buf[3] = m
                 buf[4] = s
                 buf[5] = f
-                m = bcd(int(msf[:2])  - int(data[:2]))
-                f = bcd(int(msf[6:8]) - 2*int(data[6:8]))
+                m = _BCD[int(msf[:2])  - int(data[:2])]
+                f = _BCD[int(msf[6:8]) - 2*int(data[6:8])]
                 _s = int(msf[3:5]) - int(data[3:5])
                 _s = _s + 2
                 if _s >= 60:
                     m = m + 1
                     _s = _s - 60
-                s = bcd(_s)
-                f = bcd(int(msf[6:8]) - int(data[6:8]))
+                s = _BCD[_s]
+                f = _BCD[int(msf[6:8]) - int(data[6:8])]
                 buf[7] = m
                 buf[8] = s
                 buf[9] = f
-            
+
             track = track + 1
-            toc = toc + buf
+            toc.extend(buf)
+
+        # number of tracks
+        toc[17] = _BCD[num_tracks]
+        # size of image
+        m = _BCD[int(trk_end[:2])]
+        s = _BCD[int(trk_end[3:5]) - 2]
+        f = _BCD[int(trk_end[6:8])]
+
+        # lead-out is the next frame
+        f = f + 1
+        if f == 75:
+            s = s + 1
+            f = 0
+        if s == 60:
+            m = m + 1
+            s = 0
+        toc[27] = m
+        toc[28] = s
+        toc[29] = f
 
         return toc
 
@@ -2799,10 +2932,10 @@ def create_psp(dest, disc_ids, game_title, icon0, pic0, pic1, cue_files, cu2_fil
         image = icon0
         if icon0.size[0] / icon0.size[1] < 1.4 and icon0.size[0] / icon0.size[1] > 0.75:
             if icon0.size != (80,80):
-                image = icon0.resize((80, 80), Image.Resampling.HAMMING)
+                image = icon0.resize((80, 80), Image.Resampling.LANCZOS, reducing_gap=3.0)
         else:
             if icon0.size != (144,80):
-                image = icon0.resize((144, 80), Image.Resampling.HAMMING)
+                image = icon0.resize((144, 80), Image.Resampling.LANCZOS, reducing_gap=3.0)
         i = io.BytesIO()
         image.save(i, format='PNG')
         i.seek(0)
@@ -2838,10 +2971,7 @@ def create_psp(dest, disc_ids, game_title, icon0, pic0, pic1, cue_files, cu2_fil
         f = dest + '/' + disc_ids[0]
 
     print('Install EBOOT in', f) if verbose else None
-    try:
-        os.mkdir(f)
-    except:
-        True
+    os.makedirs(f, exist_ok=True)
 
     snd0_data = None
     if snd0:
@@ -2858,7 +2988,7 @@ def create_psp(dest, disc_ids, game_title, icon0, pic0, pic1, cue_files, cu2_fil
     if snd0:
         try:
             temp_files.append(subdir + 'snd0_tmp.wav')
-            if os.name == 'posix':
+            if _IS_POSIX:
                 subprocess.call(['ffmpeg', '-y', '-i', snd0, '-filter:a', 'atempo=0.91', '-ar', '44100', '-ac', '2', subdir + 'snd0_tmp.wav'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
             else:
                 subprocess.call(['ffmpeg.exe', '-y', '-i', snd0, '-filter:a', 'atempo=0.91', '-ar', '44100', '-ac', '2', subdir + 'snd0_tmp.wav'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
@@ -2914,7 +3044,7 @@ def create_psc(dest, disc_ids, game_title, icon0, pic1, cue_files, cu2_files, im
     print('Create PS Classics/AutoBleem EBOOT.PBP for', game_title) if verbose else None
 
     # Convert ICON0 to a file object
-    image = icon0.resize((80,80), Image.Resampling.BILINEAR)
+    image = icon0.resize((80,80), Image.Resampling.LANCZOS, reducing_gap=3.0)
     i = io.BytesIO()
     image.save(i, format='PNG')
     i.seek(0)
@@ -2992,10 +3122,7 @@ def create_ps3(dest, disc_ids, game_title, icon0, pic0, pic1, cue_files, cu2_fil
     # create directory structure
     f = subdir + disc_ids[0]
     print('GameID', f)
-    try:
-        os.mkdir(f)
-    except:
-        True
+    os.makedirs(f, exist_ok=True)
 
     sfo = {
         'ANALOG_MODE': {
@@ -3053,7 +3180,7 @@ def create_ps3(dest, disc_ids, game_title, icon0, pic0, pic1, cue_files, cu2_fil
     if snd0:
         try:
             temp_files.append(subdir + 'snd0_tmp.wav')
-            if os.name == 'posix':
+            if _IS_POSIX:
                 subprocess.call(['ffmpeg', '-y', '-i', snd0, '-filter:a', 'atempo=0.91', '-ar', '44100', '-ac', '2', subdir + 'snd0_tmp.wav'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
             else:
                 subprocess.call(['ffmpeg.exe', '-y', '-i', snd0, '-filter:a', 'atempo=0.91', '-ar', '44100', '-ac', '2', subdir + 'snd0_tmp.wav'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
@@ -3062,17 +3189,22 @@ def create_ps3(dest, disc_ids, game_title, icon0, pic0, pic1, cue_files, cu2_fil
             snd0 = None
         convert_snd0_to_at3(snd0, f + '/SND0.AT3', 299, 2500000, subdir=subdir)
 
+    # Encoding the PNGs is slow so we save the images in the background
+    # and only wait for them to finish before we create the PKG.
+    image_saver = ThreadPoolExecutor(max_workers=4)
+    image_saves = []
+
     image = icon0
     if icon0.size[0] / icon0.size[1] < 1.4 and icon0.size[0] / icon0.size[1] > 0.75:
         if icon0.size != (176, 176):
-            icon0 = icon0.resize((176, 176), Image.Resampling.HAMMING)
+            icon0 = icon0.resize((176, 176), Image.Resampling.LANCZOS, reducing_gap=3.0)
         image = Image.new(icon0.mode, (320, 176), (0,0,0)).convert('RGBA')
         image.putalpha(0)
         image.paste(icon0, (72,0))
     else:
         if icon0.size != (320, 176):
-            image = icon0.resize((320, 176), Image.Resampling.HAMMING)
-    image.save(f + '/ICON0.PNG', format='PNG')
+            image = icon0.resize((320, 176), Image.Resampling.LANCZOS, reducing_gap=3.0)
+    image_saves.append(image_saver.submit(image.save, f + '/ICON0.PNG', format='PNG', optimize=False, compress_level=1))
     temp_files.append(f + '/ICON0.PNG')
 
     if pic0:
@@ -3088,12 +3220,12 @@ def create_ps3(dest, disc_ids, game_title, icon0, pic0, pic1, cue_files, cu2_fil
             pp.paste(pic0, (int((pic0.size[1] * 1.777 - pic0.size[0]) / 2),0))
 
         image = pp.resize((1000, 560), Image.Resampling.NEAREST)
-        image.save(f + '/PIC0.PNG', format='PNG')
+        image_saves.append(image_saver.submit(image.save, f + '/PIC0.PNG', format='PNG', optimize=False, compress_level=1))
         temp_files.append(f + '/PIC0.PNG')
 
     if pic1:
         image = pic1.resize((1920, 1080), Image.Resampling.NEAREST)
-        image.save(f + '/PIC1.PNG', format='PNG')
+        image_saves.append(image_saver.submit(image.save, f + '/PIC1.PNG', format='PNG', optimize=False, compress_level=1))
         temp_files.append(f + '/PIC1.PNG')
     
     if pic0:
@@ -3108,20 +3240,15 @@ def create_ps3(dest, disc_ids, game_title, icon0, pic0, pic1, cue_files, cu2_fil
             pp.putalpha(0)
             pp.paste(pic0, (0, int((pic0.size[0] / 1.333 - pic0.size[1]) / 2)))
 
-        image = pp.resize((310, 250), Image.Resampling.NEAREST)
-        image.save(f + '/PIC2.PNG', format='PNG')
+        image = pp.resize((310, 250), Image.Resampling.LANCZOS)
+        image_saves.append(image_saver.submit(image.save, f + '/PIC2.PNG', format='PNG', optimize=False, compress_level=1))
         temp_files.append(f + '/PIC2.PNG')
     
-    with open('PS3LOGO.DAT', 'rb') as i:
-        with open(f + '/PS3LOGO.DAT', 'wb') as o:
-            o.write(i.read())
-            temp_files.append(f + '/PS3LOGO.DAT')
+    copy_file('PS3LOGO.DAT', f + '/PS3LOGO.DAT')
+    temp_files.append(f + '/PS3LOGO.DAT')
 
     f = subdir + disc_ids[0] + '/USRDIR'
-    try:
-        os.mkdir(f)
-    except:
-        True
+    os.makedirs(f, exist_ok=True)
 
     _cfg = bytes([
         0x1c, 0x00, 0x00, 0x00, 0x50, 0x53, 0x31, 0x45,
@@ -3139,10 +3266,7 @@ def create_ps3(dest, disc_ids, game_title, icon0, pic0, pic1, cue_files, cu2_fil
 
         
     f = subdir + disc_ids[0] + '/USRDIR/CONTENT'
-    try:
-        os.mkdir(f)
-    except:
-        True
+    os.makedirs(f, exist_ok=True)
 
     p.eboot = subdir + disc_ids[0] + '/USRDIR/CONTENT/EBOOT.PBP'
     p.iso_bin_dat = subdir + disc_ids[0] + '/USRDIR/ISO.BIN.DAT'
@@ -3161,7 +3285,7 @@ def create_ps3(dest, disc_ids, game_title, icon0, pic0, pic1, cue_files, cu2_fil
 
     # sign the ISO.BIN.DAT
     print('Signing', p.iso_bin_dat)
-    if os.name == 'posix':
+    if _IS_POSIX:
         subprocess.call(['python3', './sign3.py', p.iso_bin_dat])
     else:
         subprocess.call(['sign3.exe', p.iso_bin_dat])
@@ -3170,13 +3294,9 @@ def create_ps3(dest, disc_ids, game_title, icon0, pic0, pic1, cue_files, cu2_fil
     # USRDIR/SAVEDATA
     #
     f = subdir + disc_ids[0] + '/USRDIR/SAVEDATA'
-    try:
-        os.mkdir(f)
-    except:
-        True
-    image = icon0.resize((80,80), Image.Resampling.BILINEAR)
-    i = io.BytesIO()
-    image.save(f + '/ICON0.PNG', format='PNG')
+    os.makedirs(f, exist_ok=True)
+    image = icon0.resize((80,80), Image.Resampling.LANCZOS, reducing_gap=3.0)
+    image_saves.append(image_saver.submit(image.save, f + '/ICON0.PNG', format='PNG', optimize=False, compress_level=1))
     temp_files.append(f + '/ICON0.PNG')    
 
     if len(mem_cards) < 1:
@@ -3242,8 +3362,11 @@ def create_ps3(dest, disc_ids, game_title, icon0, pic0, pic1, cue_files, cu2_fil
     #
     # Create PS3 PKG
     #
+    image_saver.shutdown()
+    for save in image_saves:
+        save.result()
     print('Create PKG')
-    if os.name == 'posix':
+    if _IS_POSIX:
         subprocess.call(['python3','PSL1GHT/tools/ps3py/pkg.py','-c', 'UP9000-%s_00-0000000000000001' % disc_ids[0],subdir + disc_ids[0], dest])
     else:
         subprocess.call(['pkg.exe','-c', 'UP9000-%s_00-0000000000000001' % disc_ids[0],subdir + disc_ids[0], dest])
@@ -3307,33 +3430,33 @@ def install_psp_mc(dest, game_id, mem_cards):
     except:
         True
 
+# Known memory card file sizes and the offsets of the 128kb card image(s)
+# inside them
+_MC_OFFSETS = {
+    131072: [0],
+    131200: [0x80],
+    131136: [0x40],
+    262144: [0, 131072],
+    134976: [0xf40]
+    }
+
 def check_memory_card(f):
-    if os.stat(f).st_size == 131072:
-        with open(f, 'rb') as mc:
-            return [mc.read(131072)]
-    if os.stat(f).st_size == 131200:
-        with open(f, 'rb') as mc:
-            mc.seek(0x80)
-            return [mc.read(131072)]
-    if os.stat(f).st_size == 131136:
-        with open(f, 'rb') as mc:
-            mc.seek(0x40)
-            return [mc.read(131072)]
-    if os.stat(f).st_size == 262144:
-        with open(f, 'rb') as mc:
-            return [mc.read(131072), mc.read(131072)]
-    if os.stat(f).st_size == 134976:
-        with open(f, 'rb') as mc:
-            mc.seek(0xf40)
-            return [mc.read(131072)]
+    size = os.stat(f).st_size
+    if size not in _MC_OFFSETS:
+        return None
+    mcs = []
+    with open(f, 'rb') as mc:
+        for offset in _MC_OFFSETS[size]:
+            mc.seek(offset)
+            mcs.append(mc.read(131072))
+    return mcs
     
 
 def find_psp_mount():
     candidates = ['/d', '/e', '/f', '/g']
-    if os.name == 'posix':
+    if _IS_POSIX:
         with open('/proc/self/mounts', 'r') as f:
-            lines = f.readlines()
-            for line in lines:
+            for line in f:
                 strings = line.split(' ')
                 if strings[1][:11] == '/run/media/' or strings[1][:7] == '/media/':
                     candidates.append(strings[1])
@@ -3353,10 +3476,9 @@ def find_psp_mount():
 
 def find_psc_mount():
     candidates = ['/d', '/e', '/f', '/g']
-    if os.name == 'posix':
+    if _IS_POSIX:
         with open('/proc/self/mounts', 'r') as f:
-            lines = f.readlines()
-            for line in lines:
+            for line in f:
                 strings = line.split(' ')
                 if strings[1][:11] == '/run/media/' or strings[1][:7] == '/media/':
                     candidates.append(strings[1])
@@ -3369,44 +3491,35 @@ def find_psc_mount():
     raise Exception('Could not find any PS Classic/AutoBleem devices')
 
 
+# A formatted, empty PSX memory card image
+def _make_blank_mc():
+    buf = bytearray(131072)
+    buf[0:2] = b'MC'
+    buf[0x70:0x90] = bytes([0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
+                            0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x0e,
+                            0xa0, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
+                            0xff, 0xff, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00])
+    entry = bytes([0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
+                   0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0xa0,
+                   0xa0, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
+                   0xff, 0xff, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00])
+    for i in range(0xf0, 0x780, 0x80):
+        buf[i:i + 32] = entry
+    buf[0x7f0:0x810] = bytes([0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
+                              0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0xa0,
+                              0xff, 0xff, 0xff, 0xff, 0x00, 0x00, 0x00, 0x00,
+                              0xff, 0xff, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00])
+    broken = bytes([0xff, 0xff, 0xff, 0xff, 0x00, 0x00, 0x00, 0x00,
+                    0xff, 0xff, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00])
+    for i in range(0x880, 0x1190, 0x80):
+        buf[i:i + 16] = broken
+    return bytes(buf)
+
+_BLANK_MC = _make_blank_mc()
+
 def create_blank_mc(mc):
     with open(mc, "wb") as f:
-        f.seek(131071)
-        f.write(bytes(1))
-        f.seek(0)
-        
-        buf = bytearray(2)
-        buf[0] = 0x4d
-        buf[1] = 0x43
-        f.write(buf)
-
-        buf = bytearray([0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-                         0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x0e,
-                         0xa0, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-                         0xff, 0xff, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00])
-        f.seek(0x70)
-        f.write(buf)
-
-        buf = bytearray([0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-                         0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0xa0,
-                         0xa0, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-                         0xff, 0xff, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00])
-        for i in range(0xf0, 0x780, 0x80):
-            f.seek(i)
-            f.write(buf)
-
-        buf = bytearray([0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-                         0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0xa0,
-                         0xff, 0xff, 0xff, 0xff, 0x00, 0x00, 0x00, 0x00,
-                         0xff, 0xff, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00])
-        f.seek(0x7f0)
-        f.write(buf)
-
-        buf = bytearray([0xff, 0xff, 0xff, 0xff, 0x00, 0x00, 0x00, 0x00,
-                         0xff, 0xff, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00])
-        for i in range(0x880, 0x1190, 0x80):
-            f.seek(i)
-            f.write(buf)
+        f.write(_BLANK_MC)
 
             
 def create_ps2(dest, disc_ids, game_title, icon0, pic1, cue_files, cu2_files, img_files):
@@ -3430,18 +3543,10 @@ def create_ps2(dest, disc_ids, game_title, icon0, pic1, cue_files, cu2_files, im
     discs_txt = None
     vmcdir_txt = None
     game_id = disc_ids[0]
+    base = f'{game_id[:4]}_{game_id[4:7]}.{game_id[7:9]}.{game_title}'
     if len(img_files) > 1:
-        for i in range(4):
-            pp = game_id[:4] + '_' + game_id[4:7] + '.' + game_id[7:9] + '.' + game_title
-            pp = pp + '_CD%d.VCD\n' % (i + 1)
-            if not vmcdir_txt:
-                vmcdir_txt = pp[:-5] + '\n'
-            if i >= len(img_files):
-                pp = '\n'
-            if not discs_txt:
-                discs_txt = pp
-            else:
-                discs_txt = discs_txt + pp
+        discs_txt = ''.join(f'{base}_CD{i + 1}.VCD\n' if i < len(img_files) else '\n' for i in range(4))
+        vmcdir_txt = f'{base}_CD1\n'
 
     for i in range(len(img_files)):
         f = img_files[i]
@@ -3452,20 +3557,13 @@ def create_ps2(dest, disc_ids, game_title, icon0, pic1, cue_files, cu2_files, im
         p.add_img((f, toc))
 
         print('GameID', game_id, game_title) if verbose else None
-        pp = dest + '/POPS/' + game_id[:4] + '_' + game_id[4:7] + '.' + game_id[7:9] + '.' + game_title
+        pp = dest + '/POPS/' + base
         if len(img_files) > 1:
             pp = pp + '_CD%d' % (i + 1)
-        try:
-            os.mkdir(pp)
-        except:
-            True
+        os.makedirs(pp, exist_ok=True)
         p.vcd = pp + '.VCD'
         print('Create VCD at', p.vcd) if verbose else None
         p.create_vcd()
-        try:
-            os.sync()
-        except:
-            True
 
         if discs_txt:
             with open(pp + '/DISCS.TXT', 'w') as f:
@@ -3481,13 +3579,14 @@ def create_ps2(dest, disc_ids, game_title, icon0, pic1, cue_files, cu2_files, im
             
     pp = dest + '/ART/'
     f = pp + game_id[0:4] + '_' + game_id[4:7] + '.' + game_id[7:9] + '_COV.jpg'
-    image = icon0.resize((200, 200))
-    image = image.convert('RGB')
-    image.save(f, format='JPEG', quality=100, subsampling=0)
+    save_jpeg(resize_rgb(icon0, (200, 200)), f)
     f = pp + game_id[0:4] + '_' + game_id[4:7] + '.' + game_id[7:9] + '_BG.jpg'
-    image = pic1.resize((640, 480))
-    image = image.convert('RGB')
-    image.save(f, format='JPEG', quality=100, subsampling=0)
+    save_jpeg(resize_rgb(pic1, (640, 480)), f)
+    # Flush everything we wrote to the USB stick once, not once per disc
+    try:
+        os.sync()
+    except:
+        True
 
 
 def get_disc_id(cue, real_cue_file, tmp):
@@ -3502,6 +3601,12 @@ def get_disc_id(cue, real_cue_file, tmp):
     bc = bchunk()
     bc.verbose = False
     bc.open(cue)
+    # system.cnf is almost always near the start of the disc so try to
+    # find it without converting the whole track first.
+    try:
+        return get_gameid_from_iso(io.BytesIO(_extract_iso_prefix(bc, 1, 1024 * 1024)))
+    except:
+        True
     bc.writetrack(1, tmp)
 
     gid, md5 = get_gameid_from_iso(tmp)
@@ -3538,6 +3643,20 @@ def install_deps():
         print('Installing python requests')
         subprocess.call(['pip', 'install', 'requests'])
         import requests
+    # requests_cache
+    try:
+        import requests_cache
+        print('requests_cache is already installed')
+    except:
+        print('Installing python requests_cache')
+        subprocess.call(['pip', 'install', 'requests_cache'])
+    # PyTurboJPEG
+    try:
+        import turbojpeg
+        print('PyTurboJPEG is already installed')
+    except:
+        print('Installing python PyTurboJPEG.  This needs libturbojpeg to be installed')
+        subprocess.call(['pip', 'install', 'PyTurboJPEG'])
     # pycdlib
     try:
         import pycdlib
@@ -3616,7 +3735,7 @@ def install_deps():
         print('Installing python scipy scikit-learn')
         subprocess.call(['pip', 'install', 'scipy', 'scikit-learn'])
     # cue2cu2
-    if os.name == 'posix':
+    if _IS_POSIX:
         cue2cu2_path = 'Cue2cu2/cue2cu2.py'
         os.makedirs('Cue2cu2', exist_ok=True)
     else:
@@ -3626,14 +3745,14 @@ def install_deps():
         print('cue2cu2.py is already installed')
     except:
         print('Downloading cue2cu2.py')
-        ret = requests.get('https://raw.githubusercontent.com/NRGDEAD/Cue2cu2/master/cue2cu2.py')
+        ret = _SESSION.get('https://raw.githubusercontent.com/NRGDEAD/Cue2cu2/master/cue2cu2.py')
         if ret.status_code != 200:
             print('Failed to download cue2cu2. Aborting install.')
             exit(1)
-        with open(cue2cu2_path, 'wb') as f:
-            f.write(bytes(ret.content.decode(ret.apparent_encoding), encoding='utf-8'))
+        with open(cue2cu2_path, 'wb', buffering=1 << 20) as f:
+            f.write(ret.content)
     # binmerge
-    if os.name == 'posix':
+    if _IS_POSIX:
         binmerge_path = 'binmerge/binmerge'
         os.makedirs('binmerge', exist_ok=True)
     else:
@@ -3643,13 +3762,13 @@ def install_deps():
         print('binmerge is already installed')
     except:
         print('Downloading binmerge')
-        ret = requests.get('https://raw.githubusercontent.com/putnam/binmerge/master/binmerge')
+        ret = _SESSION.get('https://raw.githubusercontent.com/putnam/binmerge/master/binmerge')
         if ret.status_code != 200:
             print('Failed to download binmerge. Aborting install.')
             exit(1)
-        with open(binmerge_path, 'wb') as f:
-            f.write(bytes(ret.content.decode(ret.apparent_encoding), encoding='utf-8'))
-    if os.name == 'posix':
+        with open(binmerge_path, 'wb', buffering=1 << 20) as f:
+            f.write(ret.content)
+    if _IS_POSIX:
         # atracdenc
         try:
             os.stat('atracdenc/src/atracdenc')
@@ -3673,7 +3792,7 @@ def install_deps():
             subprocess.call(['make'])
             os.chdir('../../..')
 
-    if os.name == 'posix':
+    if _IS_POSIX:
         # libcrypt-patcher
         try:
             os.stat('Xlibcrypt-patcher')
@@ -3686,9 +3805,6 @@ def install_deps():
             
 def generate_subchannels(magic_word):
     def generate_subchannel(sector, is_corrupt):
-        def bcd(i):
-            return int(i % 10) + 16 * (int(i / 10) % 10)
-
         sc = bytearray(12)
         s = sector - 150
         struct.pack_into('<I', sc, 0, s)
@@ -3696,20 +3812,20 @@ def generate_subchannels(magic_word):
         struct.pack_into('<B', sc, 5, 1)
         if is_corrupt:
             s = s - 1
-        struct.pack_into('<B', sc, 8, bcd(s % 75))
+        struct.pack_into('<B', sc, 8, _BCD[s % 75])
         s = s - (s % 75)
         s = int(s / 75)
-        struct.pack_into('<B', sc, 7, bcd(s % 60))
-        struct.pack_into('<B', sc, 6, bcd(int(s / 60)))
+        struct.pack_into('<B', sc, 7, _BCD[s % 60])
+        struct.pack_into('<B', sc, 6, _BCD[int(s / 60)])
 
         s = sector
         if is_corrupt:
             s = s - 1
-        struct.pack_into('<B', sc, 11, bcd(s % 75))
+        struct.pack_into('<B', sc, 11, _BCD[s % 75])
         s = s - (s % 75)
         s = int(s / 75)
-        struct.pack_into('<B', sc, 10, bcd(s % 60))
-        struct.pack_into('<B', sc, 9, bcd(int(s / 60)))
+        struct.pack_into('<B', sc, 10, _BCD[s % 60])
+        struct.pack_into('<B', sc, 9, _BCD[int(s / 60)])
 
         return sc
 
@@ -3742,16 +3858,13 @@ def generate_subchannels(magic_word):
 
 def create_sbi(sbi, magic_word):
     def generate_sbi(sector):
-        def bcd(i):
-            return int(i % 10) + 16 * (int(i / 10) % 10)
-
         sc = bytearray(4)
         s = sector
-        struct.pack_into('<B', sc, 2, bcd(s % 75))
+        struct.pack_into('<B', sc, 2, _BCD[s % 75])
         s = s - (s % 75)
         s = int(s / 75)
-        struct.pack_into('<B', sc, 1, bcd(s % 60))
-        struct.pack_into('<B', sc, 0, bcd(int(s / 60)))
+        struct.pack_into('<B', sc, 1, _BCD[s % 60])
+        struct.pack_into('<B', sc, 0, _BCD[int(s / 60)])
         struct.pack_into('<B', sc, 3, 1)
 
         sc = sc + bytes([0xff, 0xff, 0xff, 0xff,
@@ -3816,7 +3929,7 @@ def create_manual(source, gameid, subdir='./pop-fe-work/'):
             _h = hashlib.md5(games[gameid]['manual'].encode('utf-8')).hexdigest()
             f = 'https://github.com/sahlberg/pop-fe-assets/raw/master/manual/' + _h + '.DAT'
             try:
-                ret = requests.get(f, stream=True)
+                ret = _SESSION.get(f, stream=True)
             except:
                 return None
             if ret.status_code == 200:
@@ -4000,18 +4113,29 @@ def generate_cu2_files(cue_files, img_files, subdir):
         except:
             cu2_file = subdir + 'TMP%d.cu2' % (i)
             print('Creating temporary CU2 file: %s' % cu2_file) if verbose else None
-            if os.name == 'posix':
-                subprocess.call(['python3', 'Cue2cu2/cue2cu2.py', '-n', cu2_file, '--size', str(os.stat(img_file).st_size), cue_file])
-            else:
-                subprocess.call(['cue2cu2.exe', '-n', cu2_file, '--size', str(os.stat(img_file).st_size), cue_file])
+            run_cmd(CUE2CU2_CMD, ['-n', cu2_file, '--size', str(os.stat(img_file).st_size), cue_file])
             temp_files.append(cu2_file)
         cu2_files.append(cu2_file)
     
     return cu2_files
 
+# Extract one audio track as WAV and convert it to ATRAC3
+def encode_aea_track(bc, track, wav, aea):
+    bc.writetrack(track, wav)
+    try:
+        subprocess.run(ATRACDENC_CMD + ['--encode=atrac3', '-i', wav, '-o', aea], check=True, stdout=subprocess.DEVNULL)
+    except:
+        return False
+    return True
+
 def generate_aea_files(cue_files, img_files, subdir):
     aea_files = []
+    jobs = []
 
+    # Don't extract any WAV files if there is no encoder to convert them.
+    # subprocess finds atracdenc.exe on windows but os.path.exists does not.
+    have_atracdenc = have_cmd(ATRACDENC_CMD[0] + ('' if _IS_POSIX else '.exe'))
+    print_missing = False
     extra_data_track_found = False
     for d in range(len(cue_files)):
         cue_file = cue_files[d]
@@ -4021,28 +4145,40 @@ def generate_aea_files(cue_files, img_files, subdir):
         bc = bchunk()
         bc.towav = True
         bc.open(cue_file)
+        tracks = []
         for i in range(2, len(bc.cue) + 1):
             if extra_data_track_found:
                 continue
             if bc.tracks[i]['MODE'] != 'AUDIO':
-                aea_files[d] = []
+                tracks = []
                 extra_data_track_found = True
                 continue
+            tracks.append(i)
+        if tracks and not have_atracdenc:
+            print_missing = True
+            continue
+        for i in tracks:
             f = subdir + 'TRACK_%d_%02d.wav' % (d, i)
-            bc.writetrack(i, f)
             temp_files.append(f)
             aea_file = f[:-3] + 'aea'
             temp_files.append(aea_file)
             print('Converting', f, 'to', aea_file)
-            try:
-                if os.name == 'posix':
-                    subprocess.run(['./atracdenc/src/atracdenc', '--encode=atrac3', '-i', f, '-o', aea_file], check=True, stdout=subprocess.DEVNULL)
-                else:
-                    subprocess.run(['atracdenc/src/atracdenc', '--encode=atrac3', '-i', f, '-o', aea_file], check=True, stdout=subprocess.DEVNULL)
-            except:
-                print('XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX\natracdenc not found.\nCan not convert CDDA tracks.\nCreating EBOOT.PBP without support for CDDA audio.\nPlease see README file for how to install atracdenc\nXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX')
-                break
-            aea_files[d].append(aea_file)    
+            jobs.append((d, bc, i, f, aea_file))
+
+    # atracdenc is single threaded so convert all the tracks in parallel
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as ex:
+        futures = [(d, aea_file, ex.submit(encode_aea_track, bc, i, f, aea_file)) for d, bc, i, f, aea_file in jobs]
+    failed = []
+    for d, aea_file, future in futures:
+        if d in failed:
+            continue
+        if not future.result():
+            print_missing = True
+            failed.append(d)
+            continue
+        aea_files[d].append(aea_file)    
+    if print_missing:
+        print('XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX\natracdenc not found.\nCan not convert CDDA tracks.\nCreating EBOOT.PBP without support for CDDA audio.\nPlease see README file for how to install atracdenc\nXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX')
 
     return aea_files, extra_data_track_found
 
@@ -4087,16 +4223,17 @@ def process_disk_file(cue_file, idx, temp_files, subdir='./'):
         print('This is a ZIP file. Uncompress the file.') if verbose else None
         zip = cue_file
         with zipfile.ZipFile(zip, 'r') as zf:
-            for f in zf.namelist():
+            members = zf.namelist()
+            for f in members:
                 print('Extracting', subdir + f) if verbose else None
                 temp_files.append(subdir + f)
-                zf.extract(f, path=subdir)
                 if re.search('.cue$', f):
                     print('Found CUE file', f) if verbose else None
                     cue_file = subdir + f
                     # we didn't actually have a CUE file to start with so just
                     # replace the "real" cue filename with our temporary one
                     real_cue_file = cue_file
+            zf.extractall(path=subdir, members=members)
 
     if cue_file[-3:].lower() == 'img' or cue_file[-3:].lower() == 'bin':
         tmpcue = subdir + 'TMP%d.cue' % (idx)
@@ -4130,19 +4267,11 @@ def process_disk_file(cue_file, idx, temp_files, subdir='./'):
     img_file = i[0]
 
     if len(i) > 1:
-        try:
-            if os.name == 'posix':
-                os.stat('binmerge/binmerge')
-            else:
-                os.stat('binmerge.exe')
-        except:
+        if not have_cmd(BINMERGE_CMD[-1]):
             raise Exception('binmerge is required in order to support multi-bin disks. See README file for instructions on how to install binmerge.')
         mb = 'MB%d' % (idx)
         temp_files.append(mb)
-        if os.name == 'posix':
-            subprocess.call(['python3', 'binmerge/binmerge', '-o', subdir, cue_file, mb])
-        else:
-            subprocess.call(['binmerge.exe', '-o', subdir, cue_file, mb])
+        run_cmd(BINMERGE_CMD, ['-o', subdir, cue_file, mb])
         cue_file = subdir + mb + '.cue'
         temp_files.append(cue_file)
         img_file = subdir + mb + '.bin'
@@ -4157,9 +4286,10 @@ def patch_libcrypt(real_disc_ids, cue_files, img_files, subdir='pop-fe-work/'):
         print('Need to patch libcrypt for', real_disc_ids[idx])
         if len(cue_files[idx]) < len(subdir) or cue_files[idx][:len(subdir)] != subdir:
             print('Copy the files')
-            i = get_imgs_from_bin(cue_files[idx])
-            print('Copy %s to LCP%02x.bin so we can patch libcrypt' % (i[0], idx)) #if verbose else None
-            copy_file(i[0], subdir + 'LCP%02x.bin' % idx) 
+            # img_files[idx] is the first bin of this cue, process_disk_file
+            # already resolved it with get_imgs_from_bin()
+            print('Copy %s to LCP%02x.bin so we can patch libcrypt' % (img_files[idx], idx)) #if verbose else None
+            copy_file(img_files[idx], subdir + 'LCP%02x.bin' % idx) 
             temp_files.append('LCP%02x.bin' % idx)
             with open(cue_files[idx], 'r') as fi:
                 l = fi.readlines()
@@ -4169,10 +4299,7 @@ def patch_libcrypt(real_disc_ids, cue_files, img_files, subdir='pop-fe-work/'):
                 temp_files.append('LCP%02x.cue' % idx)
             cue_files[idx] = subdir + 'LCP%02x.cue' % idx
             img_files[idx] = subdir + 'LCP%02x.bin' % idx
-            if os.name == 'posix':
-                subprocess.run(['./lcp', img_files[idx]], check=True)
-            else:
-                subprocess.run(['lcp.exe', img_files[idx]], check=True)
+            subprocess.run(LCP_CMD + [img_files[idx]], check=True)
     return cue_files, img_files
 
 
@@ -4220,6 +4347,7 @@ if __name__ == "__main__":
     parser.add_argument('--resolution',
                         help='Force setting resolution to 1: NTSC 2: PAL')
     parser.add_argument('--install', action='store_true', help='Install/Build all required dependencies')
+    parser.add_argument('--no-cache', action='store_true', help='Clear the cache of downloaded files before starting')
     parser.add_argument('--whole-disk', action='store_true', help='Encode the entire disk and not just the first track. (Only applies to PS3)')
     parser.add_argument('--snd0',
                         help='WAV file to inject in PS3 PKG')
@@ -4246,6 +4374,10 @@ if __name__ == "__main__":
     if args.v:
         verbose = True
 
+    if args.no_cache and hasattr(_SESSION, 'cache'):
+        print('Clearing the cache of downloaded files') if verbose else None
+        _SESSION.cache.clear()
+
     if args.list_themes:
         for theme in themes:
             print(theme, ':', themes[theme]['description'], 'AUTO' if 'url' not in themes[theme] else themes[theme]['url'])
@@ -4282,12 +4414,7 @@ if __name__ == "__main__":
     shutil.rmtree(subdir, ignore_errors=True)
     os.mkdir(subdir)
         
-    try:
-        if os.name == 'posix':
-            os.stat('Cue2cu2/cue2cu2.py')
-        else:
-            os.stat('cue2cu2.exe')
-    except:
+    if not have_cmd(CUE2CU2_CMD[-1]):
         raise Exception('PSIO prefers CU2 files but cue2cu2.pu is not installed. See README file for instructions on how to install cue2cu2.')
 
     try:
@@ -4321,7 +4448,6 @@ if __name__ == "__main__":
                     mem_cards.append(i)
                 continue
         
-        zip = None
         print('Processing', cue_file, '...')
 
         cue_file , real_cue_file, img_file = process_disk_file(cue_file, 0 if not idx else idx[0], temp_files, subdir=subdir)
@@ -4383,6 +4509,38 @@ if __name__ == "__main__":
         for i in range(len(real_disc_ids)):
             ps3configs[i] = bytes([0x38, 0x00, 0x00, 0x00, 0x02, 0x00, 0x00, 0x00])
 
+    if args.game_id:
+        args.game_id = args.game_id.split(',')
+        # override the disc_ids with the content of --game_id
+        for idx in range(len(args.game_id)):
+            if idx < len(disc_ids):
+                disc_ids[idx] = args.game_id[idx]
+    if args.psp_install_memory_card:
+        if not args.game_id:
+            raise Exception('Must specify --game_id when using --psp-install-memory-card')
+        install_psp_mc(args.psp_dir, args.game_id[0], mem_cards)
+        quit()
+
+    # Downloading the game page and the artwork is mostly waiting on the
+    # network so start it now and let it run while we patch and convert
+    # the disc images below.
+    prefetch = ThreadPoolExecutor(max_workers=4)
+    game_future = prefetch.submit(get_game_from_gamelist, disc_ids[0])
+    pfs = None
+    if args.ps3_pkg:
+        pfs = ((176,176),(138,138))
+    if args.psp_dir:
+        pfs = ((80,80),(62,62))
+    icon0_future = None
+    if not args.cover and not args.theme:
+        icon0_future = prefetch.submit(fetch_with_game, get_icon0_from_game, disc_ids[0], game_future, args.files[0], subdir + 'ICON0.jpg', pfs)
+    pic0_future = None
+    if not args.pic0 and not args.theme:
+        pic0_future = prefetch.submit(fetch_with_game, get_pic0_from_game, disc_ids[0], game_future, args.files[0])
+    pic1_future = None
+    if not args.pic1 and not args.theme:
+        pic1_future = prefetch.submit(fetch_with_game, get_pic1_from_game, disc_ids[0], game_future, args.files[0])
+
     #
     # Apply all PPF fixes we might need
     #
@@ -4408,18 +4566,6 @@ if __name__ == "__main__":
             args.psp_use_cdda = False
             print('Extra data tracks found, forcing WHOLE DISK encoding')
 
-    if args.game_id:
-        args.game_id = args.game_id.split(',')
-        # override the disc_ids with the content of --game_id
-        for idx in range(len(args.game_id)):
-            if idx < len(disc_ids):
-                disc_ids[idx] = args.game_id[idx]
-    if args.psp_install_memory_card:
-        if not args.game_id:
-            raise Exception('Must specify --game_id when using --psp-install-memory-card')
-        install_psp_mc(args.psp_dir, args.game_id[0], mem_cards)
-        quit()
-
     resolution = 1
     if args.ps3_pkg and (real_disc_ids[0][:3] == 'SLE' or real_disc_ids[0][:3] == 'SCE'):
         print('SLES/SCES PAL game. Default resolution set to 2 (640x512)') if verbose else None
@@ -4440,7 +4586,7 @@ if __name__ == "__main__":
     if not game_title:
         game_title = get_title_from_game(disc_ids[0])
 
-    game = get_game_from_gamelist(disc_ids[0])
+    game = game_future.result()
 
     # ICON0.PNG
     icon0 = None
@@ -4454,12 +4600,10 @@ if __name__ == "__main__":
     if not icon0:
         print('Fetch ICON0 for', game_title) if verbose else None
         temp_files.append(subdir + 'ICON0.jpg')
-        pfs = None
-        if args.ps3_pkg:
-            pfs = ((176,176),(138,138))
-        if args.psp_dir:
-            pfs = ((80,80),(62,62))
-        icon0 = get_icon0_from_game(disc_ids[0], game, args.files[0], subdir + 'ICON0.jpg', pfs)
+        if icon0_future:
+            icon0 = icon0_future.result()
+        else:
+            icon0 = get_icon0_from_game(disc_ids[0], game, args.files[0], subdir + 'ICON0.jpg', pfs)
 
     # LOGO.PNG
     logo = None
@@ -4478,7 +4622,10 @@ if __name__ == "__main__":
             pic0 = get_image_from_theme(args.theme, disc_ids[0], subdir, 'PIC0.png')
     if not pic0 and not args.pic0:
         print('Fetch PIC0 for', game_title) if verbose else None
-        pic0 = get_pic0_from_game(disc_ids[0], game, args.files[0])
+        if pic0_future:
+            pic0 = pic0_future.result()
+        else:
+            pic0 = get_pic0_from_game(disc_ids[0], game, args.files[0])
 
     # PIC1.PNG
     pic1 = None
@@ -4491,7 +4638,11 @@ if __name__ == "__main__":
             pic1 = get_image_from_theme(args.theme, disc_ids[0], subdir, 'PIC1.png')
     if not pic1 and not args.pic1:
         print('Fetch PIC1 for', game_title) if verbose else None
-        pic1 = get_pic1_from_game(disc_ids[0], game, args.files[0])
+        if pic1_future:
+            pic1 = pic1_future.result()
+        else:
+            pic1 = get_pic1_from_game(disc_ids[0], game, args.files[0])
+    prefetch.shutdown()
 
     manual = None
     if not args.force_no_assets and (args.psp_dir or args.fetch_metadata):
@@ -4514,16 +4665,17 @@ if __name__ == "__main__":
 
     subchannels = []
     magic_word = []
-    for idx in range(len(real_disc_ids)):
-        if 'psp-use-cdda' in games[real_disc_ids[idx]]:
+    for did in real_disc_ids:
+        if 'psp-use-cdda' in games[did]:
             args.psp_use_cdda = True
-        if real_disc_ids[idx] not in libcrypt:
+        lc = libcrypt.get(did)
+        if lc is None:
             magic_word.append(0)
             subchannels.append(None)
             continue
         
-        magic_word.append(libcrypt[real_disc_ids[idx]]['magic_word'])
-        subchannels.append(generate_subchannels(libcrypt[real_disc_ids[idx]]['magic_word']))
+        magic_word.append(lc['magic_word'])
+        subchannels.append(generate_subchannels(lc['magic_word']))
 
     # for psp and ps3 we patch libcrypt in the respective create_[pps|ps3] functions
     if not args.no_libcrypt and not args.ps3_pkg and not args.psp_dir:
@@ -4586,21 +4738,25 @@ if __name__ == "__main__":
         create_retroarch_cue(new_path, game_title, cue_files, img_files, magic_word)
     if args.retroarch_pbp_dir:
         new_path = args.retroarch_pbp_dir + '/' + game_title + '.pbp'
+        # The PNGs are only stored in the PBP so favour encoding speed
+        # over size. Don't overwrite icon0/pic1 as the retroarch
+        # thumbnails below still need the images.
+        icon0_png = None
+        pic1_png = None
         if icon0:
-            image = icon0.resize((80,80), Image.Resampling.BILINEAR)
+            image = icon0
+            if image.size != (80, 80):
+                image = image.resize((80,80), Image.Resampling.LANCZOS, reducing_gap=3.0)
             i = io.BytesIO()
-            image.save(i, format='PNG')
-            i.seek(0)
-            icon0 = i.read()
+            image.save(i, format='PNG', compress_level=1)
+            icon0_png = i.getvalue()
 
         if pic1:
-            image = pic1
             i = io.BytesIO()
-            image.save(i, format='PNG')
-            i.seek(0)
-            pic1 = i.read()
+            pic1.save(i, format='PNG', compress_level=1)
+            pic1_png = i.getvalue()
         
-        generate_pbp(new_path, disc_ids, game_title, icon0, None, pic1, cue_files, cu2_files, img_files, aea_files, None)
+        generate_pbp(new_path, disc_ids, game_title, icon0_png, None, pic1_png, cue_files, cu2_files, img_files, aea_files, None)
     if args.retroarch_thumbnail_dir:
         create_retroarch_thumbnail(args.retroarch_thumbnail_dir, game_title, icon0, pic1)
 
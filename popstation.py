@@ -2819,17 +2819,27 @@ class popstation(object):
         offset = 0
         i = 0
 
+        # Apply the hotfixes to all the blocks in the first 1MB in one go
+        # instead of block by block so that we also catch the strings that
+        # straddle two blocks.
+        head = b''
+        if self._hotfixes:
+            head = fi.read((1048576 // 0x9300) * 0x9300)
+            for fix in self._hotfixes:
+                head = head.replace(fix[0], fix[1])
+            fi.seek(0)
+
         while True:
             if fi.tell() >= isosize:
                 break
+            pos = fi.tell()
             buf = fi.read(0x9300)
             if not buf:
                 break
+            if pos < len(head):
+                buf = head[pos:pos + len(buf)]
             if len(buf) < 0x9300:
                 buf = buf + bytearray(0x9300 - len(buf))
-            if self._hotfixes and fi.tell() < 1048576:
-                for fix in self._hotfixes:
-                    buf = buf.replace(fix[0], fix[1])
             c = buf
             if self._complevel != 0:
                 c = zlib.compress(buf, self._complevel)
@@ -2849,7 +2859,7 @@ class popstation(object):
                 struct.pack_into('<H', idx, 4, len(c))
                 fh.write(c)
                 offset = offset + len(c)
-            indexes = indexes + idx
+            indexes += idx
             i = i + 1
 
         # insert the aa3 blobs
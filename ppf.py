@@ -3,70 +3,90 @@
 #
 
 import argparse
+import mmap
 import os
 import struct
 import sys
 
 
+# Write all the patches straight into a memory mapping of the image
+# instead of doing a seek()/write() for every record. Records that lie
+# beyond the end of the image are appended to the file.
+def _patch_image(f, records):
+    size = os.fstat(f.fileno()).st_size
+    mm = mmap.mmap(f.fileno(), 0)
+    try:
+        for pos, data in records:
+            if pos + len(data) <= size:
+                mm[pos:pos + len(data)] = data
+            else:
+                f.seek(pos)
+                f.write(data)
+    finally:
+        mm.close()
+
 def ApplyPPF2(img, buf):
-    f = open(img, 'rb+')
-    print('Patchfile is a PPF2.0 patch')
-    print('Description:', buf[6:56].decode())
-    if buf[-8:-4] == b'.DIZ':
-        idlen = struct.unpack_from('<I', buf[-4:], 0)[0]
-        print(buf[-(4 + 16 + idlen):-20].decode())
-        buf = buf[:-(idlen + 38)]
-    f.seek(0, 2)
-    if f.tell() != struct.unpack_from('<I', buf[56:60], 0)[0]:
-        raise Exception('Size of image file is not correct. Can not apply PPF')
-    f.seek(0x9320)
-    if buf[60:60 + 1024] != f.read(1024):
-        raise Exception('Patch-validation failed. Can not apply PPF')
+    with open(img, 'rb+') as f:
+        print('Patchfile is a PPF2.0 patch')
+        print('Description:', buf[6:56].decode())
+        if buf[-8:-4] == b'.DIZ':
+            idlen = struct.unpack_from('<I', buf[-4:], 0)[0]
+            print(buf[-(4 + 16 + idlen):-20].decode())
+            buf = buf[:-(idlen + 38)]
+        f.seek(0, 2)
+        if f.tell() != struct.unpack_from('<I', buf[56:60], 0)[0]:
+            raise Exception('Size of image file is not correct. Can not apply PPF')
+        f.seek(0x9320)
+        if buf[60:60 + 1024] != f.read(1024):
+            raise Exception('Patch-validation failed. Can not apply PPF')
 
-    buf = buf[1084:]
-    while buf:
-        pos = struct.unpack_from('<I', buf[:4], 0)[0]
-        count = struct.unpack_from('<B', buf[4:5], 0)[0]
-        f.seek(pos)
-        f.write(buf[5:5 + count])
-        buf = buf[5 + count:]
+        def records(buf):
+            mv = memoryview(buf)
+            off = 1084
+            while off < len(mv):
+                pos, count = struct.unpack_from('<IB', mv, off)
+                yield pos, mv[off + 5:off + 5 + count]
+                off = off + 5 + count
+        _patch_image(f, records(buf))
 
 # Very incomplete, only enough to apply krHACKen's patches
 def ApplyPPF3(img, buf):
-    f = open(img, 'rb+')
-    print('Patchfile is a PPF3.0 patch')
-    method = buf[5]
-    if method != 2:
-        raise Exception('Can only handle PPF3 Method 2 for now')
-    print('Description:', buf[6:56].decode())
-    imagetype = buf[56]
-    if imagetype != 0:
-        raise Exception('Can only handle imagetype 0 for now')
-    blockcheck = buf[57]
-    undo = buf[58]
+    with open(img, 'rb+') as f:
+        print('Patchfile is a PPF3.0 patch')
+        method = buf[5]
+        if method != 2:
+            raise Exception('Can only handle PPF3 Method 2 for now')
+        print('Description:', buf[6:56].decode())
+        imagetype = buf[56]
+        if imagetype != 0:
+            raise Exception('Can only handle imagetype 0 for now')
+        blockcheck = buf[57]
+        undo = buf[58]
 
-    if buf[-6:-4] == b'.DIZ':
-        idlen = struct.unpack_from('<I', buf[-2:], 0)[0]
-        print(buf[-(2 + 16 + idlen):-20].decode())
-        buf = buf[:-(idlen + 38)]
-        raise Exception('Can not handle PPF with DIZ data yet')
-    
-    if blockcheck:
-        f.seek(0x9320)
-        if buf[60:60 + 1024] != f.read(1024):
-            raise Exception('Patch-validation failed. Can not apply PPF')
-        buf = buf[1084:]
-    else:
-        buf = buf[60:]
-        
-    while buf:
-        pos = struct.unpack_from('<Q', buf[:8], 0)[0]
-        count = struct.unpack_from('<B', buf[8:9], 0)[0]
-        f.seek(pos)
-        f.write(buf[9:9 + count])
-        buf = buf[9 + count:]
-        if undo:
-            buf = buf[count:]
+        if buf[-6:-4] == b'.DIZ':
+            idlen = struct.unpack_from('<I', buf[-2:], 0)[0]
+            print(buf[-(2 + 16 + idlen):-20].decode())
+            buf = buf[:-(idlen + 38)]
+            raise Exception('Can not handle PPF with DIZ data yet')
+
+        if blockcheck:
+            f.seek(0x9320)
+            if buf[60:60 + 1024] != f.read(1024):
+                raise Exception('Patch-validation failed. Can not apply PPF')
+            start = 1084
+        else:
+            start = 60
+
+        def records(buf):
+            mv = memoryview(buf)
+            off = start
+            while off < len(mv):
+                pos, count = struct.unpack_from('<QB', mv, off)
+                yield pos, mv[off + 9:off + 9 + count]
+                off = off + 9 + count
+                if undo:
+                    off = off + count
+        _patch_image(f, records(buf))
 
         
 def ApplyPPF(img, ppf):